@@ -21,12 +21,32 @@ Author: Created for Social Graphs project
 Date: November 2025
 """
 
+import functools
+import hashlib
+import multiprocessing
+from collections import Counter
 import os
 import json
+import pickle
 import re
 import networkx as nx
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 
+# Optional: orjson parses the article JSONs several times faster than the
+# stdlib json module. Fall back to json if not installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional: pyahocorasick scans a line for all name variants in one pass
+# instead of one rfind per variant. Fall back to rfind if not installed.
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 # ---------- CONFIG ----------
 input_folder = "/Users/smilladue/Desktop/Documents/DTU/social-graphs/IP_graph/wiki_foreign_relations_jsons"
 
@@ -38,30 +58,80 @@ DEBUG = False  # Set to False to disable debug output
 DEBUG_COUNTRY = "Denmark"  # Which country to debug
 DEBUG_DETAILED = False  # Show embassy and alliance detection details
 
+# ---------- COMPILED PATTERNS ----------
+# Precompiled once at import time; the parsing functions below are called for
+# every table/row/notes line, so avoiding re-compilation/cache lookups matters.
+_RE_FOREIGN_RELATIONS_PREFIX = re.compile(r"Foreign[_ ]relations[_ ]of[_ ]", re.IGNORECASE)
+_RE_COUNTRY_SUFFIX = re.compile(r'\s*_country_\s*', re.IGNORECASE)
+_RE_WIKITABLE_START = re.compile(r'\{\| class="wikitable[^"]*"')
+_RE_FLAG = re.compile(r'\{\{[Ff]lag\|([^}|]+)')
+_RE_INVOKE_FLAG = re.compile(r'\{\{#invoke:flag\|\|([^}|]+)', re.IGNORECASE)
+# Self-closing refs (<ref name="abc" />) and paired refs (<ref>...</ref>)
+# combined into one alternation so stripping is a single scan
+_RE_REF = re.compile(r'<ref[^>]*/>|<ref[^>]*>.*?</ref>', re.DOTALL | re.IGNORECASE)
+_RE_WIKILINK_PIPE = re.compile(r'\[\[([^\]|]+)\|([^\]]+)\]\]')
+_RE_WIKILINK = re.compile(r'\[\[([^\]]+)\]\]')
+_RE_SENT_SPLIT = re.compile(r'[.;]\s*')
+_RE_ACCREDITED = re.compile(r'(.+?)\s+is accredited to\s+(.+?)\s+through its (?:embassy|high commission) in')
+_RE_EMBASSY = re.compile(r'(has an? (?:embassy|consulate|high commission)|maintains an? (?:embassy|consulate|high commission)|(?:embassy|consulate|high commission) in)')
+# All membership phrasings combined into one alternation so the notes text is
+# scanned once instead of once per pattern. Non-greedy .*? keeps the fuzzy
+# "both ... are ... members of" branches from backtracking badly on long notes.
+_RE_MEMBERSHIP = re.compile(
+    r'both countries are full members'
+    r'|both countries are members'
+    r'|both countries became members'
+    r'|both countries are member states'
+    r'|both.*?are.*?members? of'
+    r'|both.*?became.*?members? of'
+    r'|both nations are members'
+    r'|both countries belong'
+    r'|membership of both'
+)
+
 # ---------- LOAD DATA ----------
-print("Loading JSON files...")
-wiki_data = {}
-for file in os.listdir(input_folder):
-    if not file.endswith(".json"):
-        continue
-    with open(os.path.join(input_folder, file), "r", encoding="utf-8") as f:
-        text = json.load(f)
-    
-    # Skip disambiguation pages (they just redirect to other pages)
-    if '{{Disambig}}' in text or '{{disambiguation}}' in text:
-        continue
-    
-    # Extract country name from filename: "Foreign relations of CountryName.json"
-    country = re.sub(r"Foreign[_ ]relations[_ ]of[_ ]", "", file.replace(".json", ""), flags=re.IGNORECASE)
-    
-    # Clean up special cases
-    # "Georgia _country_" -> "Georgia"
-    country = re.sub(r'\s*_country_\s*', '', country, flags=re.IGNORECASE)
-    country = country.replace("_", " ").strip()
-    wiki_data[country] = text
 
-countries = list(wiki_data.keys())
-print(f"Loaded {len(countries)} countries")
+def _load_json_file(path):
+    """Read and parse one article JSON (worker for the parallel load)."""
+    if orjson is not None:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_wiki_data(folder):
+    """
+    Load all "Foreign relations of X.json" files from folder in parallel.
+    Returns dict of country name -> raw wikitext.
+    """
+    # os.scandir yields name and type in one syscall per entry, unlike
+    # os.listdir + os.path.join + stat
+    files = []
+    paths = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json") and entry.is_file():
+                files.append(entry.name)
+                paths.append(entry.path)
+
+    wiki_data = {}
+    with ProcessPoolExecutor() as executor:
+        for file, text in zip(files, executor.map(_load_json_file, paths, chunksize=8)):
+            # Skip disambiguation pages (they just redirect to other pages)
+            if '{{Disambig}}' in text or '{{disambiguation}}' in text:
+                continue
+
+            # Extract country name from filename: "Foreign relations of CountryName.json"
+            country = _RE_FOREIGN_RELATIONS_PREFIX.sub("", file.replace(".json", ""))
+
+            # Clean up special cases
+            # "Georgia _country_" -> "Georgia"
+            country = _RE_COUNTRY_SUFFIX.sub('', country)
+            country = country.replace("_", " ").strip()
+            wiki_data[country] = text
+
+    return wiki_data
 
 # ---------- HELPER FUNCTIONS ----------
 
@@ -90,13 +160,13 @@ def extract_country_name_from_flag(flag_text):
     Also handles {{#invoke:flag||CountryName}} format used in some Wikipedia pages
     """
     # Try standard format: {{flag|CountryName}}
-    match = re.search(r'\{\{[Ff]lag\|([^}|]+)', flag_text)
+    match = _RE_FLAG.search(flag_text)
     if match:
         country = match.group(1).strip()
         return country
-    
+
     # Try invoke format: {{#invoke:flag||CountryName}}
-    match = re.search(r'\{\{#invoke:flag\|\|([^}|]+)', flag_text, re.IGNORECASE)
+    match = _RE_INVOKE_FLAG.search(flag_text)
     if match:
         country = match.group(1).strip()
         return country
@@ -110,30 +180,32 @@ def find_bilateral_tables(text):
     Returns list of (table_text, start_pos) tuples.
     """
     tables = []
-    
+
     # Pattern for wikitables - they start with {| and end with |}
     # We need to be careful with nested braces
-    table_starts = []
-    for match in re.finditer(r'\{\| class="wikitable[^"]*"', text):
-        table_starts.append(match.start())
-    
+    table_starts = [match.start() for match in _RE_WIKITABLE_START.finditer(text)]
+
+    # Find the matching closing |} for each start by jumping between
+    # delimiters with str.find instead of scanning character by character
+    # (the old loop sliced a fresh 2-char string per position).
     for start in table_starts:
-        # Find the matching closing |}
-        depth = 0
-        i = start
-        while i < len(text):
-            if text[i:i+2] == '{|':
+        depth = 1
+        i = start + 2
+        while True:
+            open_pos = text.find('{|', i)
+            close_pos = text.find('|}', i)
+            if close_pos == -1:
+                break  # unterminated table, skip it
+            if open_pos != -1 and open_pos < close_pos:
                 depth += 1
-                i += 2
-            elif text[i:i+2] == '|}':
+                i = open_pos + 2
+            else:
                 depth -= 1
                 if depth == 0:
-                    tables.append((text[start:i+2], start))
+                    tables.append((text[start:close_pos + 2], start))
                     break
-                i += 2
-            else:
-                i += 1
-    
+                i = close_pos + 2
+
     return tables
 
 
@@ -149,291 +221,366 @@ def parse_wikitable_rows(table_text):
     *Additional notes on new lines
     """
     rows = []
-    
-    # Split by row delimiters (|- marks new row)
-    row_sections = re.split(r'\n\|-', table_text)
-    
-    for row_section in row_sections[1:]:  # Skip header
-        if not row_section.strip() or row_section.strip().startswith('!'):
-            continue
-        
-        # Find the line with data (starts with | and contains {{flag)
-        lines = row_section.split('\n')
-        data_line = None
-        data_line_idx = -1
-        
-        for idx, line in enumerate(lines):
-            line_stripped = line.strip()
-            # Check for both {{flag and {{#invoke:flag formats
-            # The line might just be attributes like "valign=top", so also check if it contains a flag
-            if ('{{flag' in line.lower() or '{{#invoke:flag' in line.lower()):
-                # This line contains a flag template
-                if line_stripped.startswith('|'):
-                    data_line = line_stripped
-                    data_line_idx = idx
-                    break
-        
-        if not data_line:
-            continue
-        
-        # Remove leading |
-        if data_line.startswith('|'):
-            data_line = data_line[1:]
-        
-        # Extract country from the line before splitting by ||
-        # This handles cases like {{#invoke:flag||Algeria}} where || appears inside the template
-        country = extract_country_name_from_flag(data_line)
-        if not country:
-            continue
-        
-        # Handle two table formats:
-        # Format 1: Columns on same line with || separator: |{{flag|Country}}||Date||Notes
-        # Format 2: Columns on separate lines with | prefix: 
-        #   |{{flag|Country}}
-        #   |Date
-        #   |Notes
-        
-        notes_parts = []
-        
-        if '||' in data_line:
-            # Format 1: Double-pipe separator
-            columns = data_line.split('||')
-            
-            if len(columns) < 2:
-                continue
-            
-            # Notes are in the last column (3rd column if present, else 2nd column)
-            if len(columns) >= 3:
-                notes_parts.append(columns[2])
-            elif len(columns) >= 2:
-                notes_parts.append(columns[1])
+
+    # Single pass over the table's lines with explicit per-row state,
+    # instead of splitting into row sections and scanning each one twice.
+    # State is reset at every |- delimiter.
+    skipping = True        # True while in the table header or a discarded row
+    awaiting_first = False # haven't seen the row's first non-blank line yet
+    country = None         # set once the flag line has been found
+    format1_notes = None   # notes column for Format 1 rows (|| separators)
+    column_lines = []      # | column lines after the flag line (Format 2)
+    early_notes = []       # continuation lines seen during the column scan (Format 2)
+    late_notes = []        # continuation lines after the data line (both formats)
+
+    def _flush_row():
+        # Assemble the pending row, if a usable flag line was found:
+        # Format 1: chosen notes column, then continuation lines
+        # Format 2: early continuation lines, then the 2nd column onwards
+        # (the 1st column after the flag is usually the date), then the
+        # remaining continuation lines
+        if country is None:
+            return
+        if format1_notes is not None:
+            notes_parts = format1_notes + late_notes
         else:
-            # Format 2: Single-pipe on separate lines
-            # Find all lines starting with | after the flag line
-            # Typically: |number |{{flag|Country}} |Date |Notes
-            # Notes could be on the 3rd or 4th | line depending on if there's a number column
-            
-            # Collect all | lines after the flag line
-            column_lines = []
-            for idx in range(data_line_idx + 1, len(lines)):
-                line = lines[idx].strip()
-                if not line:
-                    continue
-                if line.startswith('|-'):
-                    break
-                if line.startswith('|') and not line.startswith('||'):
-                    column_lines.append(line[1:].strip())  # Remove leading |
-                elif not line.startswith('|'):
-                    # This might be a continuation line (bullet point)
-                    if column_lines:  # Only add if we've found at least one column
-                        notes_parts.append(line)
-            
-            # The first column line after the flag is usually the date
-            # Any remaining column lines or non-column lines are notes
+            notes_parts = list(early_notes)
             if len(column_lines) >= 2:
-                # Use the 2nd column onwards as notes
                 notes_parts.extend(column_lines[1:])
-            elif len(column_lines) == 1:
-                # Just one more column (date), check for continuation lines
-                pass  # notes_parts already has continuation lines
-        
-        # Add any continuation lines that follow (bullet points, additional notes)
-        if data_line_idx >= 0 and data_line_idx + 1 < len(lines):
-            for line in lines[data_line_idx + 1:]:
-                line = line.strip()
-                if line.startswith('|-'):
-                    break
-                # Skip lines we already processed as columns
-                if line.startswith('|') and '||' not in data_line:
-                    continue  # Already processed above for Format 2
-                if line and not line.startswith('|'):
-                    notes_parts.append(line)
-        
-        notes = '\n'.join(notes_parts)
-        
+            notes_parts.extend(late_notes)
         rows.append({
             'country': country,
-            'notes': notes
+            'notes': '\n'.join(notes_parts)
         })
-    
+
+    for raw_line in table_text.split('\n'):
+        if raw_line.startswith('|-'):
+            # Row delimiter: flush the previous row and reset state.
+            # Anything after the |- on the same line belongs to the new row.
+            _flush_row()
+            skipping = False
+            awaiting_first = True
+            country = None
+            format1_notes = None
+            column_lines = []
+            early_notes = []
+            late_notes = []
+            raw_line = raw_line[2:]
+
+        if skipping:
+            continue
+
+        line = raw_line.strip()
+
+        # Header rows (first non-blank line starts with !) carry no data
+        if awaiting_first and line:
+            awaiting_first = False
+            if line.startswith('!'):
+                skipping = True
+                continue
+
+        if country is None:
+            # Still looking for the data line (starts with | and contains a
+            # {{flag or {{#invoke:flag template; earlier lines might just be
+            # attributes like "valign=top")
+            line_lower = line.lower()
+            if ('{{flag' in line_lower or '{{#invoke:flag' in line_lower) and line.startswith('|'):
+                # Remove leading | and extract country before splitting by ||
+                # This handles cases like {{#invoke:flag||Algeria}} where ||
+                # appears inside the template
+                data_line = line[1:]
+                country = extract_country_name_from_flag(data_line)
+                if not country:
+                    skipping = True
+                    continue
+
+                # Handle two table formats:
+                # Format 1: Columns on same line with || separator: |{{flag|Country}}||Date||Notes
+                # Format 2: Columns on separate lines with | prefix:
+                #   |{{flag|Country}}
+                #   |Date
+                #   |Notes
+                if '||' in data_line:
+                    columns = data_line.split('||')
+                    # Notes are in the last column (3rd column if present, else 2nd column)
+                    if len(columns) >= 3:
+                        format1_notes = [columns[2]]
+                    else:
+                        format1_notes = [columns[1]]
+            continue
+
+        # Lines after the data line
+        if not line:
+            continue
+
+        # An indented |- (not caught as a row delimiter above because of the
+        # leading whitespace) still ends the current row's notes
+        if line.startswith('|-'):
+            skipping = True
+            continue
+
+        if format1_notes is not None:
+            # Format 1: only bare continuation lines (bullet points) count
+            if not line.startswith('|'):
+                late_notes.append(line)
+        elif line.startswith('|'):
+            if not line.startswith('||'):
+                column_lines.append(line[1:].strip())  # Remove leading |
+        else:
+            # This might be a continuation line (bullet point)
+            if column_lines:  # Only count if we've found at least one column
+                early_notes.append(line)
+            late_notes.append(line)
+
+    _flush_row()
+
     return rows
 
 
-def has_mutual_embassies(notes, source_country, target_country):
+# Common abbreviations and alternative names, keyed by the exact normalized
+# country name. Checked first as an O(1) fast path.
+_ABBREV_MAP = {
+    'democratic republic of the congo': ('dr congo', 'drc', 'congolese'),
+    'democratic republic of congo': ('dr congo', 'drc', 'congolese'),
+    'republic of the congo': ('congo', 'republic of congo', 'congo-brazzaville', 'congolese'),
+    'republic of congo': ('congo', 'republic of congo', 'congo-brazzaville', 'congolese'),
+    'united states': ('us', 'usa', 'u.s.', 'u.s.a.', 'american'),
+    'united kingdom': ('uk', 'u.k.', 'british'),
+    'united arab emirates': ('uae', 'u.a.e.', 'emirati'),
+    'central african republic': ('car', 'c.a.r.', 'c.a.r', 'central african'),
+    # Handle both "Gambia" and "the Gambia"
+    'gambia': ('gambia', 'the gambia', 'gambian'),
+}
+
+# Fallback substring rules for names that don't exact-match (e.g.
+# "United States of America"). Ordered like the old elif chain so the
+# most specific needle wins.
+_ABBREV_RULES = [(needle, extras) for needle, extras in _ABBREV_MAP.items()]
+
+# Adjective forms for common countries, same exact-match-first layout
+_ADJECTIVE_MAP = {
+    'russia': ('russian',),
+    'china': ('chinese',),
+    'japan': ('japanese',),
+    'germany': ('german',),
+    'france': ('french',),
+    'spain': ('spanish',),
+    'italy': ('italian',),
+    'poland': ('polish',),
+    'turkey': ('turkish',),
+    'brazil': ('brazilian',),
+    'india': ('indian',),
+    'egypt': ('egyptian',),
+    'nigeria': ('nigerian',),
+    'saudi arabia': ('saudi',),
+    'south africa': ('south african',),
+    'mexico': ('mexican',),
+    'canada': ('canadian',),
+    'australia': ('australian',),
+    'sweden': ('swedish',),
+    'norway': ('norwegian',),
+    'denmark': ('danish',),
+    'netherlands': ('dutch',),
+    'belgium': ('belgian',),
+    'switzerland': ('swiss',),
+    'austria': ('austrian',),
+    'portugal': ('portuguese',),
+    'greece': ('greek',),
+    'iran': ('iranian',),
+    'iraq': ('iraqi',),
+    'israel': ('israeli',),
+    'pakistan': ('pakistani',),
+    'afghanistan': ('afghan',),
+    'thailand': ('thai',),
+    'vietnam': ('vietnamese',),
+    'philippines': ('philippine',),
+    'indonesia': ('indonesian',),
+    'malaysia': ('malaysian',),
+    'singapore': ('singaporean',),
+    'south korea': ('south korean', 'korean'),
+    'north korea': ('north korean', 'korean'),
+}
+
+_ADJECTIVE_RULES = [(needle, extras) for needle, extras in _ADJECTIVE_MAP.items()]
+
+
+# Create list of alternative names/abbreviations for matching
+# This handles common abbreviations like "DR Congo", "DRC", "UK", "US", etc.
+# Cached because the same country is looked up once per table row.
+@functools.lru_cache(maxsize=4096)
+def get_country_variants(country_name):
+    """Get list of possible name variants for a country"""
+    normalized = normalize_country_name(country_name).lower()
+    variants = [normalized]
+
+    abbrevs = _ABBREV_MAP.get(normalized)
+    if abbrevs is None:
+        for needle, extras in _ABBREV_RULES:
+            if needle in normalized:
+                abbrevs = extras
+                break
+    if abbrevs:
+        variants.extend(abbrevs)
+
+    adjectives = _ADJECTIVE_MAP.get(normalized)
+    if adjectives is None:
+        for needle, extras in _ADJECTIVE_RULES:
+            if needle in normalized:
+                adjectives = extras
+                break
+    if adjectives:
+        variants.extend(adjectives)
+
+    # Tuple so the variant list is hashable (used as an lru_cache key below)
+    return tuple(variants)
+
+
+@functools.lru_cache(maxsize=4096)
+def _variants_automaton(variants):
+    """Build an Aho-Corasick automaton matching any of the given variants."""
+    automaton = ahocorasick.Automaton()
+    for variant in variants:
+        automaton.add_word(variant, len(variant))
+    automaton.make_automaton()
+    return automaton
+
+
+def _rightmost_variant_start(variants, text):
+    """
+    Return the rightmost start position of any variant in text, or -1.
+    Uses one Aho-Corasick pass when available, else one rfind per variant.
+    """
+    best = -1
+    if ahocorasick is not None:
+        for end, length in _variants_automaton(variants).iter(text):
+            start = end - length + 1
+            if start > best:
+                best = start
+    else:
+        for variant in variants:
+            pos = text.rfind(variant)
+            if pos > best:
+                best = pos
+    return best
+
+
+def clean_notes(notes):
+    """
+    Strip markup from a row's notes once per row and lowercase for
+    case-insensitive matching. Returns (embassy_text, membership_text):
+
+    - embassy_text additionally has wikilink markup removed, since [[...]]
+      interferes with the subject detection in has_mutual_embassies
+    - membership_text keeps wikilinks because phrases like "members of" can
+      sit in the link target (e.g. [[Member states of NATO|...]])
+    """
+    # Remove self-closing and paired ref tags in one pass
+    no_refs = _RE_REF.sub('', notes)
+
+    membership_text = no_refs.lower()
+
+    # Replace [[link|text]] with just text
+    no_links = _RE_WIKILINK_PIPE.sub(r'\2', no_refs)
+    # Replace [[link]] with just link
+    no_links = _RE_WIKILINK.sub(r'\1', no_links)
+
+    return no_links.lower(), membership_text
+
+
+def _split_bullets(text):
+    """
+    Split notes at bullet points in a single pass over the lines.
+    A segment break is a * or • that is the first non-whitespace character
+    after a newline; whitespace-only lines before the bullet belong to the
+    delimiter, everything else keeps its place inside the segment.
+    """
+    segments = []
+    current = []         # lines of the segment being built
+    pending_blanks = []  # whitespace-only lines not yet assigned
+    first = True
+
+    for line in text.split('\n'):
+        stripped = line.lstrip()
+        if not first and stripped[:1] in ('*', '•'):
+            # Bullet line: close the current segment, drop the blank lines
+            # leading up to the bullet, start a new segment after the bullet
+            segments.append('\n'.join(current))
+            pending_blanks = []
+            current = [stripped[1:]]
+        elif not stripped:
+            pending_blanks.append(line)
+        else:
+            current.extend(pending_blanks)
+            pending_blanks = []
+            current.append(line)
+        first = False
+
+    current.extend(pending_blanks)
+    segments.append('\n'.join(current))
+    return segments
+
+
+def has_mutual_embassies(notes_clean, source_variants, target_variants):
     """
     Check if the notes indicate both countries have embassies in each other.
     Returns True if both conditions met:
     - source_country has embassy in target_country
     - target_country has embassy in source_country
-    
+
+    notes_clean is the embassy text from clean_notes;
+    source_variants/target_variants are the precomputed name-variant lists
+    from get_country_variants.
+
     The notes typically have bullet points like:
     * CountryA has an embassy in [CityInCountryB]
     * CountryB has an embassy in [CityInCountryA]
-    
+
     Important: The subject (country having the embassy) comes BEFORE "has an embassy" or "has embassy"
     """
-    # Strip out <ref>...</ref> tags as they contain spurious country name mentions
-    # First remove self-closing ref tags like <ref name="abc" />
-    notes_clean = re.sub(r'<ref[^>]*/>', '', notes, flags=re.IGNORECASE)
-    # Then remove paired ref tags like <ref>...</ref>
-    notes_clean = re.sub(r'<ref[^>]*>.*?</ref>', '', notes_clean, flags=re.DOTALL|re.IGNORECASE)
-    
-    # Remove wikilink markup [[...]] and [[...|...]] as it interferes with pattern matching
-    # Replace [[link|text]] with just text
-    notes_clean = re.sub(r'\[\[([^\]|]+)\|([^\]]+)\]\]', r'\2', notes_clean)
-    # Replace [[link]] with just link
-    notes_clean = re.sub(r'\[\[([^\]]+)\]\]', r'\1', notes_clean)
-    
-    # Normalize country names for comparison (handles "the X" vs "X")
-    source_normalized = normalize_country_name(source_country).lower()
-    target_normalized = normalize_country_name(target_country).lower()
-    
-    # Create list of alternative names/abbreviations for matching
-    # This handles common abbreviations like "DR Congo", "DRC", "UK", "US", etc.
-    def get_country_variants(country_name):
-        """Get list of possible name variants for a country"""
-        normalized = normalize_country_name(country_name).lower()
-        variants = [normalized]
-        
-        # Common abbreviations and alternative names
-        if 'democratic republic of the congo' in normalized or 'democratic republic of congo' in normalized:
-            variants.extend(['dr congo', 'drc', 'congolese'])
-        elif 'republic of the congo' in normalized or 'republic of congo' in normalized:
-            variants.extend(['congo', 'republic of congo', 'congo-brazzaville', 'congolese'])
-        elif 'united states' in normalized:
-            variants.extend(['us', 'usa', 'u.s.', 'u.s.a.', 'american'])
-        elif 'united kingdom' in normalized:
-            variants.extend(['uk', 'u.k.', 'british'])
-        elif 'united arab emirates' in normalized:
-            variants.extend(['uae', 'u.a.e.', 'emirati'])
-        elif 'central african republic' in normalized:
-            variants.extend(['car', 'c.a.r.', 'c.a.r', 'central african'])
-        elif 'gambia' in normalized:
-            # Handle both "Gambia" and "the Gambia"
-            variants.extend(['gambia', 'the gambia', 'gambian'])
-        
-        # Add adjective forms for common countries
-        if 'russia' in normalized:
-            variants.append('russian')
-        elif 'china' in normalized:
-            variants.append('chinese')
-        elif 'japan' in normalized:
-            variants.append('japanese')
-        elif 'germany' in normalized:
-            variants.append('german')
-        elif 'france' in normalized:
-            variants.append('french')
-        elif 'spain' in normalized:
-            variants.append('spanish')
-        elif 'italy' in normalized:
-            variants.append('italian')
-        elif 'poland' in normalized:
-            variants.append('polish')
-        elif 'turkey' in normalized:
-            variants.append('turkish')
-        elif 'brazil' in normalized:
-            variants.append('brazilian')
-        elif 'india' in normalized:
-            variants.append('indian')
-        elif 'egypt' in normalized:
-            variants.append('egyptian')
-        elif 'nigeria' in normalized:
-            variants.append('nigerian')
-        elif 'saudi arabia' in normalized:
-            variants.append('saudi')
-        elif 'south africa' in normalized:
-            variants.append('south african')
-        elif 'mexico' in normalized:
-            variants.append('mexican')
-        elif 'canada' in normalized:
-            variants.append('canadian')
-        elif 'australia' in normalized:
-            variants.append('australian')
-        elif 'sweden' in normalized:
-            variants.append('swedish')
-        elif 'norway' in normalized:
-            variants.append('norwegian')
-        elif 'denmark' in normalized:
-            variants.append('danish')
-        elif 'netherlands' in normalized:
-            variants.append('dutch')
-        elif 'belgium' in normalized:
-            variants.append('belgian')
-        elif 'switzerland' in normalized:
-            variants.append('swiss')
-        elif 'austria' in normalized:
-            variants.append('austrian')
-        elif 'portugal' in normalized:
-            variants.append('portuguese')
-        elif 'greece' in normalized:
-            variants.append('greek')
-        elif 'iran' in normalized:
-            variants.append('iranian')
-        elif 'iraq' in normalized:
-            variants.append('iraqi')
-        elif 'israel' in normalized:
-            variants.append('israeli')
-        elif 'pakistan' in normalized:
-            variants.append('pakistani')
-        elif 'afghanistan' in normalized:
-            variants.append('afghan')
-        elif 'thailand' in normalized:
-            variants.append('thai')
-        elif 'vietnam' in normalized:
-            variants.append('vietnamese')
-        elif 'philippines' in normalized:
-            variants.append('philippine')
-        elif 'indonesia' in normalized:
-            variants.append('indonesian')
-        elif 'malaysia' in normalized:
-            variants.append('malaysian')
-        elif 'singapore' in normalized:
-            variants.append('singaporean')
-        elif 'korea' in normalized:
-            if 'south' in normalized:
-                variants.extend(['south korean', 'korean'])
-            elif 'north' in normalized:
-                variants.extend(['north korean', 'korean'])
-        
-        return variants
-    
-    source_variants = get_country_variants(source_country)
-    target_variants = get_country_variants(target_country)
-    
+    # Fast reject: every pattern below requires one of these keywords, so
+    # skip the split/regex work entirely for rows that can't match
+    if ('embassy' not in notes_clean
+            and 'consulate' not in notes_clean
+            and 'commission' not in notes_clean):
+        return False
+
     # Split notes into bullet points (lines starting with *) OR by sentences (periods/semicolons)
     # First try splitting by bullet points
-    lines = re.split(r'[\n\r]+\s*[\*•]', notes_clean)
-    
+    lines = _split_bullets(notes_clean)
+
     # If only one line (no bullet points), split by periods or semicolons to get sentences
     if len(lines) == 1:
-        lines = re.split(r'[.;]\s*', notes_clean)
+        lines = _RE_SENT_SPLIT.split(notes_clean)
     
     # Filter out empty lines
     lines = [line.strip() for line in lines if line.strip()]
     
     source_has_embassy = False
     target_has_embassy = False
-    
-    for line in lines:
-        line_lower = line.lower()
-        
+
+    # Bind the hot lookups once; this loop runs for every line of every row
+    accredited_search = _RE_ACCREDITED.search
+    embassy_search = _RE_EMBASSY.search
+
+    for line_lower in lines:
         # Special pattern: "Country A is accredited to Country B through its embassy in City"
         # This means Country A has an embassy in City (which is in Country B)
-        accredited_match = re.search(r'(.+?)\s+is accredited to\s+(.+?)\s+through its (?:embassy|high commission) in', line_lower)
+        # (cheap substring test first; the regex can't match without it)
+        accredited_match = accredited_search(line_lower) if 'accredited' in line_lower else None
         if accredited_match:
             # The country before "is accredited" is the one with the embassy
             country_with_embassy = accredited_match.group(1).strip()
             
             # Check all variants
-            if any(variant in country_with_embassy for variant in source_variants):
+            if _rightmost_variant_start(source_variants, country_with_embassy) >= 0:
                 source_has_embassy = True
-            elif any(variant in country_with_embassy for variant in target_variants):
+            elif _rightmost_variant_start(target_variants, country_with_embassy) >= 0:
                 target_has_embassy = True
             continue
         
         # Look for embassy/consulate/high commission phrases indicating a country HAS diplomatic presence
         # Patterns: "has an embassy", "maintains an embassy", "has a consulate", "has a high commission", etc.
-        embassy_match = re.search(r'(has an? (?:embassy|consulate|high commission)|maintains an? (?:embassy|consulate|high commission)|(?:embassy|consulate|high commission) in)', line_lower)
+        embassy_match = embassy_search(line_lower)
         if not embassy_match:
             continue
         
@@ -445,103 +592,71 @@ def has_mutual_embassies(notes, source_country, target_country):
         # This handles cases like "Brunei has embassy in X, the Russian embassy in Y"
         # where both countries appear before the second "embassy in"
         
-        source_positions = []
-        target_positions = []
-        
-        for variant in source_variants:
-            pos = before_embassy.rfind(variant)  # rfind = rightmost (closest to embassy phrase)
-            if pos >= 0:
-                source_positions.append(pos)
-        
-        for variant in target_variants:
-            pos = before_embassy.rfind(variant)
-            if pos >= 0:
-                target_positions.append(pos)
-        
+        # rightmost occurrence = closest to the embassy phrase
+        source_pos = _rightmost_variant_start(source_variants, before_embassy)
+        target_pos = _rightmost_variant_start(target_variants, before_embassy)
+
         # The country whose name appears closest to the embassy phrase is the subject
-        if source_positions and target_positions:
+        if source_pos >= 0 and target_pos >= 0:
             # Both mentioned - use the one closest to the embassy phrase
-            if max(source_positions) > max(target_positions):
+            if source_pos > target_pos:
                 source_has_embassy = True
             else:
                 target_has_embassy = True
-        elif source_positions:
+        elif source_pos >= 0:
             source_has_embassy = True
-        elif target_positions:
+        elif target_pos >= 0:
             target_has_embassy = True
     
     return source_has_embassy and target_has_embassy
 
 
-def has_shared_membership(notes):
+def has_shared_membership(notes_clean):
     """
     Check if the notes indicate both countries are members of same organization.
-    Looks for phrases like:
+    Takes the membership text from clean_notes. Looks for phrases like:
     - "Both countries are full members of NATO"
     - "Both countries are members of the European Union"
     - "Both countries became members of the European Union"
     """
-    # Strip out <ref>...</ref> tags as they may contain spurious text
-    notes_clean = re.sub(r'<ref[^>]*/>', '', notes, flags=re.IGNORECASE)
-    notes_clean = re.sub(r'<ref[^>]*>.*?</ref>', '', notes_clean, flags=re.DOTALL|re.IGNORECASE)
-    
-    notes_lower = notes_clean.lower()
-    
-    membership_patterns = [
-        r'both countries are full members',
-        r'both countries are members',
-        r'both countries became members',
-        r'both countries are member states',
-        r'both.*are.*members? of',
-        r'both.*became.*members? of',
-        r'both nations are members',
-        r'both countries belong',
-        r'membership of both',
-    ]
-    
-    for pattern in membership_patterns:
-        if re.search(pattern, notes_lower):
-            return True
-    
-    return False
+    return bool(_RE_MEMBERSHIP.search(notes_clean))
 
 
-# ---------- BUILD GRAPH ----------
-G = nx.Graph()
-G.add_nodes_from(countries)
+# ---------- PARALLEL WORKERS ----------
+# The per-country parsing/classification is CPU-bound and independent per
+# article, so it runs in worker processes. The shared lookup tables are
+# handed to each worker once via the pool initializer instead of being
+# pickled with every task.
 
-# Create a mapping for normalized country names to actual node names
-# This handles cases like "United States" (from flag) vs "the United States" (from filename)
-country_mapping = {}
-for country in countries:
-    normalized = normalize_country_name(country).lower()
-    country_mapping[normalized] = country
-    # Also map the original name (in case it doesn't have "the")
-    country_mapping[country.lower()] = country
+def _init_build_worker(country_mapping, variants_by_country):
+    global _worker_country_mapping, _worker_variants_by_country
+    _worker_country_mapping = country_mapping
+    _worker_variants_by_country = variants_by_country
 
-# Track statistics
-total_tables_found = 0
-total_rows_processed = 0
-edges_from_embassies = 0
-edges_from_embassies_and_alliance = 0
 
-print(f"\nBuilding graph (REQUIRE_ALLIANCE={REQUIRE_ALLIANCE})...")
+def _parse_country(item):
+    """
+    Parse one country's article into wikitable rows.
+    Returns (source_country, tables_rows) where tables_rows is one row list
+    per bilateral table. Results only depend on the article text, so they
+    are cached to disk between runs (see main).
+    """
+    source_country, raw_text = item
 
-for source_country, raw_text in tqdm(wiki_data.items(), desc="Processing countries"):
     # Find all potential bilateral relation tables
     tables = find_bilateral_tables(raw_text)
-    total_tables_found += len(tables)
-    
+
     if DEBUG and source_country == DEBUG_COUNTRY:
         print(f"\n\n{'='*80}")
         print(f"DEBUG: Processing {source_country}")
         print(f"Found {len(tables)} tables")
         print(f"{'='*80}")
-    
+
+    tables_rows = []
     for table_idx, (table_text, _) in enumerate(tables):
         rows = parse_wikitable_rows(table_text)
-        total_rows_processed += len(rows)
-        
+        tables_rows.append(rows)
+
         if DEBUG and source_country == DEBUG_COUNTRY and table_idx < 2:
             print(f"\n--- Table {table_idx + 1} ---")
             print(f"Rows found: {len(rows)}")
@@ -549,50 +664,163 @@ for source_country, raw_text in tqdm(wiki_data.items(), desc="Processing countri
                 print(f"\nRow {i+1}:")
                 print(f"  Country: {row['country']}")
                 print(f"  Notes (first 200 chars): {row['notes'][:200]}...")
-        
+
+    return source_country, tables_rows
+
+
+def _classify_country(item):
+    """
+    Classify every parsed table row for one source country.
+    Returns (source_country, candidates) where candidates is a list of
+    (target_country, has_alliance) pairs that passed the mutual-embassy
+    check. Edge weighting stays in the parent process.
+    """
+    source_country, tables_rows = item
+    country_mapping = _worker_country_mapping
+    variants_by_country = _worker_variants_by_country
+
+    # The source's variants are the same for every row of this article
+    source_variants = variants_by_country[source_country]
+
+    candidates = []
+
+    for table_idx, rows in enumerate(tables_rows):
         for row_idx, row in enumerate(rows):
             target_country_raw = row['country']
             notes = row['notes']
-            
-            # Map the target country name to the actual node name using normalization
-            target_country_normalized = normalize_country_name(target_country_raw).lower()
-            target_country = country_mapping.get(target_country_normalized)
-            
+
+            # Map the target country name to the actual node name; the mapping
+            # already contains both "the X" and "X" keys, so no normalization
+            # is needed here
+            target_country = country_mapping.get(target_country_raw.strip().lower())
+
             # Skip if target country not in our dataset or is the same as source
             if not target_country or target_country == source_country:
                 continue
-            
-            # Check embassy condition (use raw name for comparison in notes)
-            embassies_mutual = has_mutual_embassies(notes, source_country, target_country_raw)
-            
+
+            # Strip markup and lowercase once; both checks below reuse it
+            notes_embassy, notes_membership = clean_notes(notes)
+
+            # Check embassy condition (use raw name's variants for comparison in notes)
+            embassies_mutual = has_mutual_embassies(
+                notes_embassy,
+                source_variants,
+                get_country_variants(target_country_raw),
+            )
+
             if DEBUG and DEBUG_DETAILED and source_country == DEBUG_COUNTRY and table_idx == 1 and row_idx < 5:
                 print(f"\n  Checking {source_country} -> {target_country}:")
                 print(f"    Mutual embassies: {embassies_mutual}")
                 if not embassies_mutual:
                     print(f"    Notes preview: {notes[:300]}...")
-            
+
             if not embassies_mutual:
                 continue
-            
+
             # Check alliance/membership condition
-            has_alliance = has_shared_membership(notes)
-            
+            has_alliance = has_shared_membership(notes_membership)
+
             if DEBUG and DEBUG_DETAILED and source_country == DEBUG_COUNTRY and table_idx == 1 and row_idx < 5:
                 print(f"    Has alliance: {has_alliance}")
-            
-            # Determine if we should add edge based on flag
-            should_add_edge = False
-            weight = 0.0
-            
-            if REQUIRE_ALLIANCE:
-                # Only add edge if both embassies AND shared membership
-                if embassies_mutual and has_alliance:
-                    should_add_edge = True
-                    weight = 1.0
-                    edges_from_embassies_and_alliance += 1
-            else:
-                # Add edge if embassies exist
-                if embassies_mutual:
+
+            candidates.append((target_country, has_alliance))
+
+    return source_country, candidates
+
+
+def main():
+    print("Loading JSON files...")
+    wiki_data = load_wiki_data(input_folder)
+    countries = list(wiki_data.keys())
+    print(f"Loaded {len(countries)} countries")
+
+    # ---------- BUILD GRAPH ----------
+    G = nx.Graph()
+    G.add_nodes_from(countries)
+
+    # Create a mapping for normalized country names to actual node names
+    # This handles cases like "United States" (from flag) vs "the United States" (from filename)
+    # Both the "the X" and plain "X" forms are keyed here so the row loop can
+    # look raw flag names up directly without normalizing each one first
+    country_mapping = {}
+    for country in countries:
+        normalized = normalize_country_name(country).lower()
+        country_mapping[normalized] = country
+        country_mapping['the ' + normalized] = country
+        # Also map the original name (in case it doesn't have "the")
+        country_mapping[country.lower()] = country
+
+    # Precompute name variants for every source country once, so the row loop
+    # only does dict lookups instead of rebuilding the same lists per row
+    variants_by_country = {country: get_country_variants(country) for country in countries}
+
+    # ---------- PARSE (cached) ----------
+    # Parsed rows depend only on the article text, so they are cached on
+    # disk keyed by a digest of the input. Re-runs with a different
+    # REQUIRE_ALLIANCE only redo the classification and graph assembly.
+    digest = hashlib.blake2b(digest_size=16)
+    for country in sorted(wiki_data):
+        digest.update(country.encode("utf-8"))
+        digest.update(wiki_data[country].encode("utf-8"))
+    cache_file = f"parsed_rows_{digest.hexdigest()}.pkl"
+
+    if os.path.exists(cache_file):
+        print(f"Loading parsed rows from cache: {cache_file}")
+        with open(cache_file, "rb") as f:
+            parsed_rows = pickle.load(f)
+    else:
+        print("Parsing wikitables...")
+        # imap_unordered lets fast articles stream back while slow ones are
+        # still being parsed; chunking amortizes the per-task IPC cost
+        with multiprocessing.Pool() as pool:
+            parsed_rows = dict(tqdm(
+                pool.imap_unordered(_parse_country, wiki_data.items(), chunksize=8),
+                total=len(wiki_data), desc="Parsing countries"
+            ))
+        with open(cache_file, "wb") as f:
+            pickle.dump(parsed_rows, f, protocol=pickle.HIGHEST_PROTOCOL)
+        print(f"Cached parsed rows to: {cache_file}")
+
+    # Track statistics
+    total_tables_found = sum(len(tables_rows) for tables_rows in parsed_rows.values())
+    total_rows_processed = sum(
+        len(rows) for tables_rows in parsed_rows.values() for rows in tables_rows
+    )
+    edges_from_embassies = 0
+    edges_from_embassies_and_alliance = 0
+
+    print(f"\nBuilding graph (REQUIRE_ALLIANCE={REQUIRE_ALLIANCE})...")
+
+    # Accumulate max edge weights in a plain dict keyed by the sorted node
+    # pair, then bulk-load into networkx once at the end; per-edge
+    # has_edge/add_edge calls are much slower than a dict update
+    edge_weights = {}
+
+    # Results can arrive in any order: weights reduce by max and the
+    # counters are plain sums, so the final graph is unaffected
+    with multiprocessing.Pool(
+        initializer=_init_build_worker,
+        initargs=(country_mapping, variants_by_country),
+    ) as pool:
+        results = pool.imap_unordered(_classify_country, parsed_rows.items(), chunksize=8)
+
+        for source_country, candidates in tqdm(
+            results, total=len(parsed_rows), desc="Processing countries"
+        ):
+            for target_country, has_alliance in candidates:
+                # Determine if we should add edge based on flag
+                # (every candidate already passed the mutual-embassy check)
+                should_add_edge = False
+                weight = 0.0
+
+                if REQUIRE_ALLIANCE:
+                    # Only add edge if both embassies AND shared membership
+                    if has_alliance:
+                        should_add_edge = True
+                        weight = 1.0
+                        edges_from_embassies_and_alliance += 1
+                else:
+                    # Add edge if embassies exist
                     should_add_edge = True
                     if has_alliance:
                         weight = 1.0
@@ -600,48 +828,49 @@ for source_country, raw_text in tqdm(wiki_data.items(), desc="Processing countri
                     else:
                         weight = 0.5
                         edges_from_embassies += 1
-            
-            # Add or update edge
-            if should_add_edge:
-                if G.has_edge(source_country, target_country):
-                    # Keep the maximum weight
-                    G[source_country][target_country]["weight"] = max(
-                        G[source_country][target_country]["weight"], 
-                        weight
-                    )
-                else:
-                    G.add_edge(source_country, target_country, weight=weight)
-
-# ---------- STATISTICS ----------
-# Count actual edges by weight
-edges_by_weight = {}
-for u, v, data in G.edges(data=True):
-    weight = data.get('weight', 0.0)
-    edges_by_weight[weight] = edges_by_weight.get(weight, 0) + 1
-
-print(f"\n{'='*60}")
-print(f"GRAPH STATISTICS")
-print(f"{'='*60}")
-print(f"Nodes (countries): {len(G.nodes())}")
-print(f"Edges (relations): {len(G.edges())}")
-print(f"Average edges per node: {len(G.edges())/len(G.nodes()):.1f}")
-print(f"Total tables found: {total_tables_found}")
-print(f"Total rows processed: {total_rows_processed}")
-print(f"\nEDGE BREAKDOWN:")
-if REQUIRE_ALLIANCE:
-    print(f"  Edges with embassy + alliance: {len(G.edges())}")
-else:
-    print(f"  Edges with weight 0.5 (embassy only): {edges_by_weight.get(0.5, 0)}")
-    print(f"  Edges with weight 1.0 (embassy + alliance): {edges_by_weight.get(1.0, 0)}")
-    print(f"  Total edges: {len(G.edges())}")
-
-# ---------- SAVE GRAPH ----------
-output_filename = "foreign_relations_table_based"
-if REQUIRE_ALLIANCE:
-    output_filename += "_with_alliance.gexf"
-else:
-    output_filename += "_embassy_only.gexf"
-
-nx.write_gexf(G, output_filename)
-print(f"\n✓ Saved: {output_filename}")
-print(f"{'='*60}")
+
+                # Record edge, keeping the maximum weight
+                if should_add_edge:
+                    if source_country <= target_country:
+                        key = (source_country, target_country)
+                    else:
+                        key = (target_country, source_country)
+                    if weight > edge_weights.get(key, 0.0):
+                        edge_weights[key] = weight
+
+    G.add_weighted_edges_from((u, v, w) for (u, v), w in edge_weights.items())
+
+    # ---------- STATISTICS ----------
+    # Count actual edges by weight
+    edges_by_weight = Counter(nx.get_edge_attributes(G, 'weight').values())
+
+    print(f"\n{'='*60}")
+    print(f"GRAPH STATISTICS")
+    print(f"{'='*60}")
+    print(f"Nodes (countries): {len(G.nodes())}")
+    print(f"Edges (relations): {len(G.edges())}")
+    print(f"Average edges per node: {len(G.edges())/len(G.nodes()):.1f}")
+    print(f"Total tables found: {total_tables_found}")
+    print(f"Total rows processed: {total_rows_processed}")
+    print(f"\nEDGE BREAKDOWN:")
+    if REQUIRE_ALLIANCE:
+        print(f"  Edges with embassy + alliance: {len(G.edges())}")
+    else:
+        print(f"  Edges with weight 0.5 (embassy only): {edges_by_weight.get(0.5, 0)}")
+        print(f"  Edges with weight 1.0 (embassy + alliance): {edges_by_weight.get(1.0, 0)}")
+        print(f"  Total edges: {len(G.edges())}")
+
+    # ---------- SAVE GRAPH ----------
+    output_filename = "foreign_relations_table_based"
+    if REQUIRE_ALLIANCE:
+        output_filename += "_with_alliance.gexf"
+    else:
+        output_filename += "_embassy_only.gexf"
+
+    nx.write_gexf(G, output_filename)
+    print(f"\n✓ Saved: {output_filename}")
+    print(f"{'='*60}")
+
+
+if __name__ == "__main__":
+    main()